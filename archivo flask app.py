@@ -1,8 +1,40 @@
 import os
 import json
 import csv
-from flask import Flask, render_template, request, redirect, url_for
+import atexit
+import queue
+import threading
+import time
+from flask import Flask, render_template, stream_template, request, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import QueuePool
+
+# Usa la librería JSON más rápida que esté instalada (orjson, luego ujson) y,
+# si no hay ninguna, el módulo estándar. Ambas funciones trabajan con bytes.
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    # Las alternativas se configuran para producir el mismo texto que orjson:
+    # sin espacios, sin escapar caracteres no ASCII ni la barra '/'.
+    try:
+        import ujson
+
+        _json_loads = ujson.loads
+
+        def _json_dumps(obj):
+            return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+    except ImportError:
+        _json_loads = json.loads
+
+        def _json_dumps(obj):
+            return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
 
 # --- Configuración de la App y la Base de Datos ---
 
@@ -11,6 +43,11 @@ from flask_sqlalchemy import SQLAlchemy
 # sin importar desde dónde se ejecute la aplicación.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+# Carpeta de los archivos TXT, JSON y CSV, también relativa a este archivo
+# y no al directorio desde el que se lance la aplicación.
+datos_dir = os.path.join(basedir, 'datos')
+os.makedirs(datos_dir, exist_ok=True)
+
 app = Flask(__name__)
 
 # Configura la URI de la base de datos para usar SQLite.
@@ -20,6 +57,20 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'da
 # Desactiva una característica de SQLAlchemy que no necesitamos y que consume recursos.
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Reutiliza las conexiones SQLite desde un pool en lugar de abrir y cerrar una
+# por petición. Cada hilo toma su propia conexión, así que el commit o rollback
+# de una sesión no afecta a las demás; con LIFO se reutiliza primero la última
+# conexión devuelta, que es la que tiene la caché de páginas más "caliente".
+# 'check_same_thread' se desactiva porque una conexión del pool puede acabar
+# en un hilo distinto del que la abrió.
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'poolclass': QueuePool,
+    'pool_use_lifo': True,
+    'pool_size': 5,
+    'max_overflow': 10,
+    'connect_args': {'check_same_thread': False},
+}
+
 # Inicializa la extensión SQLAlchemy, conectándola con nuestra app Flask.
 db = SQLAlchemy(app)
 
@@ -44,9 +95,153 @@ class Usuario(db.Model):
 # Este bloque se asegura de que las tablas de la base de datos se creen
 # a partir de los modelos definidos. Solo se ejecuta una vez cuando la app arranca.
 with app.app_context():
+    @event.listens_for(db.engine, "connect")
+    def configurar_sqlite(conexion_dbapi, _registro):
+        """Ajusta los pragmas de SQLite en cada conexión nueva."""
+        cursor = conexion_dbapi.cursor()
+        # WAL: los lectores no bloquean a los escritores.
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL sigue siendo seguro y evita un fsync en cada commit.
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
     db.create_all()
 
 
+# --- Escritura de Usuarios en Segundo Plano ---
+
+# Las rutas que guarden usuarios no hacen commit ellas mismas: llaman a
+# encolar_usuario() y responden enseguida (por ejemplo con un 202). Un hilo de
+# fondo agrupa hasta LOTE_USUARIOS registros, o lo que llegue en
+# ESPERA_LOTE_SEG segundos, y los confirma en un solo commit. A cambio, un
+# cierre brusco puede perder los usuarios que aún estén en la cola.
+LOTE_USUARIOS = 100
+ESPERA_LOTE_SEG = 0.05
+# Cola acotada de tuplas (nombre, mensaje): si sigue llena tras ESPERA_COLA_SEG
+# segundos, encolar_usuario() lanza queue.Full en lugar de bloquear la petición.
+ESPERA_COLA_SEG = 2
+cola_usuarios = queue.Queue(maxsize=1000)
+
+def encolar_usuario(nombre, mensaje):
+    """
+    Deja un usuario pendiente de guardar en la base de datos. Lanza queue.Full
+    si la cola no tiene sitio; la ruta puede responder entonces con un 503.
+    """
+    cola_usuarios.put((nombre, mensaje), timeout=ESPERA_COLA_SEG)
+
+def guardar_lote_usuarios(lote):
+    """
+    Guarda un lote de (nombre, mensaje) en un solo commit. Si el lote falla
+    (por ejemplo, por un usuario sin nombre), lo reintenta fila a fila para
+    que solo se pierdan las filas inválidas.
+    """
+    # El contexto de aplicación da a este hilo su propia sesión, que toma
+    # una conexión propia del pool y la devuelve al cerrarse el contexto;
+    # así el commit o rollback del lote no toca las sesiones de las peticiones.
+    with app.app_context():
+        try:
+            db.session.add_all([Usuario(nombre=n, mensaje=m) for n, m in lote])
+            db.session.commit()
+            return
+        except SQLAlchemyError:
+            db.session.rollback()
+            app.logger.warning("Lote de %d usuarios rechazado; se reintenta uno a uno", len(lote))
+
+        for nombre, mensaje in lote:
+            try:
+                db.session.add(Usuario(nombre=nombre, mensaje=mensaje))
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                app.logger.exception("No se pudo guardar el usuario %r", nombre)
+
+def guardar_usuarios_en_lote():
+    """Bucle del hilo de fondo: vacía la cola por lotes. None indica que debe terminar."""
+    terminar = False
+    while not terminar:
+        usuario = cola_usuarios.get()
+        if usuario is None:
+            break
+        lote = [usuario]
+        limite = time.monotonic() + ESPERA_LOTE_SEG
+        while len(lote) < LOTE_USUARIOS:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                siguiente = cola_usuarios.get(timeout=restante)
+            except queue.Empty:
+                break
+            if siguiente is None:
+                terminar = True
+                break
+            lote.append(siguiente)
+
+        # Cualquier error inesperado se registra y el hilo sigue vivo; si
+        # muriera, la cola se llenaría y ninguna petición podría encolar más.
+        try:
+            guardar_lote_usuarios(lote)
+        except Exception:
+            app.logger.exception("Error inesperado al guardar un lote de %d usuarios", len(lote))
+
+hilo_usuarios = threading.Thread(target=guardar_usuarios_en_lote, daemon=True)
+hilo_usuarios.start()
+
+def detener_hilo_usuarios():
+    """Al salir, pide al hilo que guarde lo pendiente y espera a que termine."""
+    try:
+        cola_usuarios.put(None, timeout=5)
+    except queue.Full:
+        return
+    hilo_usuarios.join(timeout=5)
+
+atexit.register(detener_hilo_usuarios)
+
+
+# --- Caché de Respuestas de Lectura ---
+
+# Guarda el HTML de /datos_txt y /datos_json junto con la "firma" del archivo
+# leído (fecha de modificación y tamaño). Mientras el archivo no cambie, la
+# página se sirve desde memoria sin leer el disco ni renderizar la plantilla.
+cache_respuestas = {}
+# Las páginas más grandes que este límite no se guardan en memoria.
+CACHE_MAX_BYTES = 1024 * 1024
+
+def firma_archivo(ruta):
+    """Devuelve (mtime en ns, tamaño) del archivo, o None si no existe."""
+    try:
+        info = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+def leer_cache(clave, firma):
+    """Devuelve la página guardada para 'clave' si se generó con la misma firma."""
+    entrada = cache_respuestas.get(clave)
+    if entrada is not None and entrada[0] == firma:
+        return entrada[1]
+    return None
+
+def guardar_cache(clave, firma, partes):
+    """
+    Entrega las partes de una respuesta (en streaming) y, al terminar, guarda
+    la página completa en la caché si no supera CACHE_MAX_BYTES.
+    """
+    acumulado = []
+    total = 0
+    for parte in partes:
+        if acumulado is not None:
+            total += len(parte)
+            if total > CACHE_MAX_BYTES:
+                acumulado = None
+            else:
+                acumulado.append(parte)
+        yield parte
+    if acumulado is not None:
+        cache_respuestas[clave] = (firma, ''.join(acumulado))
+
+
 # --- Rutas de la Aplicación ---
 
 @app.route('/')
@@ -56,67 +251,122 @@ def index():
 
 # --- 1. Persistencia con Archivos TXT ---
 
+# 'datos.txt' se abre una sola vez en modo 'append' (añadir al final) y se
+# reutiliza en todas las peticiones; el lock evita que dos hilos mezclen líneas.
+# Cada línea se vuelca en cuanto se escribe: así llega al archivo con un único
+# write(), como antes, y no se pierde ni se corta si el proceso cae o si hay
+# varios procesos escribiendo a la vez.
+RUTA_TXT = os.path.join(datos_dir, 'datos.txt')
+archivo_txt = open(RUTA_TXT, 'a', encoding='utf-8', buffering=64 * 1024)
+lock_txt = threading.Lock()
+atexit.register(archivo_txt.close)
+
 @app.route('/guardar_txt', methods=['POST'])
 def guardar_txt():
     """Recibe datos del formulario y los guarda en un archivo de texto."""
     nombre = request.form['nombre']
     mensaje = request.form['mensaje']
     
-    # Abre 'datos.txt' en modo 'append' (añadir al final) y escribe una nueva línea.
-    with open('datos/datos.txt', 'a', encoding='utf-8') as archivo:
-        archivo.write(f"Nombre: {nombre}, Mensaje: {mensaje}\n")
+    with lock_txt:
+        archivo_txt.write(f"Nombre: {nombre}, Mensaje: {mensaje}\n")
+        archivo_txt.flush()
+    cache_respuestas.pop('txt', None)
         
     return redirect(url_for('ver_datos_txt'))
 
+def leer_lineas_txt():
+    """Recorre el archivo de texto línea a línea sin cargarlo entero en memoria."""
+    with open(RUTA_TXT, 'r', encoding='utf-8') as archivo:
+        yield from archivo
+
 @app.route('/datos_txt')
 def ver_datos_txt():
     """Lee y muestra el contenido del archivo de texto."""
-    try:
-        with open('datos/datos.txt', 'r', encoding='utf-8') as archivo:
-            contenido = archivo.readlines()
-        return render_template('resultado.html', titulo="Datos Guardados (TXT)", datos=contenido)
-    except FileNotFoundError:
-        return "El archivo de texto aún no existe. Envía datos desde el formulario primero."
+    firma = firma_archivo(RUTA_TXT)
+    # El archivo se crea al arrancar, así que "sin datos" es que esté vacío.
+    if firma is None or firma[1] == 0:
+        return "El archivo de texto aún no tiene datos. Envía datos desde el formulario primero."
+    pagina = leer_cache('txt', firma)
+    if pagina is not None:
+        return pagina
+    # stream_template envía la página a medida que la plantilla recorre las líneas.
+    partes = stream_template('resultado.html', titulo="Datos Guardados (TXT)", datos=leer_lineas_txt())
+    return guardar_cache('txt', firma, partes)
 
 # --- 2. Persistencia con Archivos JSON ---
 
+# Los datos se guardan en formato NDJSON (un objeto JSON por línea): cada alta
+# solo añade una línea al final y la lectura recorre el archivo línea a línea.
+RUTA_JSON = os.path.join(datos_dir, 'datos.ndjson')
+
 def leer_json():
-    """Función auxiliar para leer el contenido del archivo JSON."""
+    """Función auxiliar que recorre el archivo NDJSON y devuelve cada registro."""
     try:
-        with open('datos/datos.json', 'r', encoding='utf-8') as archivo:
-            return json.load(archivo)
-    except (FileNotFoundError, json.JSONDecodeError):
-        # Si el archivo no existe o está vacío, devuelve una lista vacía.
-        return []
-
-def escribir_json(datos):
-    """Función auxiliar para escribir datos en el archivo JSON."""
-    with open('datos/datos.json', 'w', encoding='utf-8') as archivo:
-        # 'indent=4' formatea el JSON para que sea legible.
-        json.dump(datos, archivo, indent=4, ensure_ascii=False)
+        with open(RUTA_JSON, 'rb') as archivo:
+            for linea in archivo:
+                if not linea.strip():
+                    continue
+                try:
+                    yield _json_loads(linea)
+                except ValueError:
+                    # Una línea dañada no debe impedir leer el resto.
+                    continue
+    except FileNotFoundError:
+        # Si el archivo no existe todavía, no hay registros que devolver.
+        return
+
+def escribir_json(dato):
+    """Función auxiliar para añadir un registro al final del archivo NDJSON."""
+    with open(RUTA_JSON, 'ab') as archivo:
+        archivo.write(_json_dumps(dato) + b'\n')
 
 @app.route('/guardar_json', methods=['POST'])
 def guardar_json():
     """Recibe datos y los añade al archivo JSON."""
-    datos_existentes = leer_json()
     nuevo_dato = {"nombre": request.form['nombre'], "mensaje": request.form['mensaje']}
-    datos_existentes.append(nuevo_dato)
-    escribir_json(datos_existentes)
+    escribir_json(nuevo_dato)
+    cache_respuestas.pop('json', None)
     
     return redirect(url_for('ver_datos_json'))
 
 @app.route('/datos_json')
 def ver_datos_json():
     """Lee y muestra el contenido del archivo JSON."""
-    datos = leer_json()
+    firma = firma_archivo(RUTA_JSON)
+    pagina = leer_cache('json', firma)
+    if pagina is not None:
+        return pagina
     # Convertimos los dicts a strings para una visualización simple en la plantilla
-    datos_str = [json.dumps(item, ensure_ascii=False) for item in datos]
-    return render_template('resultado.html', titulo="Datos Guardados (JSON)", datos=datos_str)
+    datos_str = [_json_dumps(item).decode('utf-8') for item in leer_json()]
+    pagina = render_template('resultado.html', titulo="Datos Guardados (JSON)", datos=datos_str)
+    if len(pagina) <= CACHE_MAX_BYTES:
+        cache_respuestas['json'] = (firma, pagina)
+    return pagina
 
 # --- 3. Persistencia con Archivos CSV ---
 
+# Igual que con el TXT, el archivo y su csv.writer se crean una sola vez y se
+# comparten entre peticiones protegidos por un lock. Como no hay ninguna ruta
+# que lea el CSV, el buffer se vuelca cada CSV_FLUSH_CADA filas y al salir.
+CSV_FLUSH_CADA = 100
+archivo_csv = open(os.path.join(datos_dir, 'datos.csv'), 'a', encoding='utf-8', newline='', buffering=64 * 1024)
+escritor_csv = csv.writer(archivo_csv)
+lock_csv = threading.Lock()
+filas_csv_pendientes = 0
+atexit.register(archivo_csv.close)
+
 @app.route('/guardar_csv', methods=['POST'])
 def guardar_csv():
     """Recibe datos y los añade como una nueva fila en un archivo CSV."""
+    global filas_csv_pendientes
     nombre = request.form['nombre']
-    mensaje = request.
+    mensaje = request.form['mensaje']
+
+    with lock_csv:
+        escritor_csv.writerow([nombre, mensaje])
+        filas_csv_pendientes += 1
+        if filas_csv_pendientes >= CSV_FLUSH_CADA:
+            archivo_csv.flush()
+            filas_csv_pendientes = 0
+
+    return redirect(url_for('index'))
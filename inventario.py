@@ -7,7 +7,10 @@
 # crear un sistema de inventario robusto y eficiente.
 # -----------------------------------------------------------------------------
 
+import atexit
+import contextlib
 import sqlite3
+from functools import lru_cache
 
 # =============================================================================
 # SECCIÓN 1: CLASE MODELO - Producto
@@ -24,19 +27,27 @@ class Producto:
         cantidad (int): Cantidad disponible en stock.
         precio (float): Precio unitario del producto.
     """
+    # __slots__ evita el __dict__ por instancia y reduce la memoria usada
+    # cuando el inventario contiene muchos productos.
+    __slots__ = ('id', 'nombre', 'cantidad', 'precio', '_str_cache')
+
     def __init__(self, nombre, cantidad, precio, id_producto=None):
         """Inicializa un objeto Producto."""
         self.id = id_producto
         self.nombre = nombre
         self.cantidad = cantidad
         self.precio = precio
+        # Texto ya formateado del producto; se invalida (None) al modificarlo.
+        self._str_cache = None
 
     def __str__(self):
         """Devuelve una representación en cadena del producto para ser impresa."""
-        return (f"ID: {self.id:<5} | "
-                f"Nombre: {self.nombre:<30} | "
-                f"Cantidad: {self.cantidad:<10} | "
-                f"Precio: ${self.precio:>8.2f}")
+        if self._str_cache is None:
+            self._str_cache = (f"ID: {self.id:<5} | "
+                               f"Nombre: {self.nombre:<30} | "
+                               f"Cantidad: {self.cantidad:<10} | "
+                               f"Precio: ${self.precio:>8.2f}")
+        return self._str_cache
 
 # =============================================================================
 # SECCIÓN 2: CLASE CONTROLADORA - Inventario
@@ -53,145 +64,390 @@ class Inventario:
         Inicializa el inventario, conecta a la BD y carga los productos.
         """
         self.db_path = db_path
+        # True mientras hay abierta una transacción de transaction(); los
+        # métodos que modifican datos relanzan entonces sus errores.
+        self._transaccion_activa = False
+        # Se mantiene una única conexión abierta durante toda la vida del
+        # inventario para no reabrir el archivo de la BD en cada operación.
+        self._conn = self._conectar()
+        if self._conn:
+            atexit.register(self.close)
         self._crear_tabla()
         # El DICCIONARIO es la colección elegida para optimizar el acceso
         # a los productos por su ID, lo que lo hace extremadamente rápido.
         self.productos = self._cargar_productos()
+        # Caché de búsquedas por nombre (texto en minúsculas -> IDs) propia de
+        # esta instancia. Se vacía en cada alta o baja, que son las únicas que
+        # cambian los nombres, y al cerrar. Envuelve un método ligado, así que
+        # vive tanto como el inventario (que atexit mantiene hasta close()).
+        self._buscar_cached = lru_cache(maxsize=128)(self._ids_por_nombre)
         print("✔ Inventario cargado y listo.")
 
     def _conectar(self):
-        """Crea y devuelve una conexión a la base de datos."""
+        """Crea la conexión persistente a la base de datos y ajusta sus pragmas."""
+        conn = None
         try:
-            conn = sqlite3.connect(self.db_path)
+            # isolation_level=None: modo autocommit, cada sentencia se confirma sola.
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            # Filas accesibles por nombre de columna además de por posición.
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-20000")
             return conn
         except sqlite3.Error as e:
             print(f"❌ Error al conectar a la base de datos: {e}")
+            if conn is not None:
+                conn.close()
             return None
 
+    @staticmethod
+    def _minusculas(texto):
+        """
+        Pasa el texto a minúsculas con las reglas Unicode de Python. Se guarda
+        en 'nombre_min' porque lower(), LIKE y NOCASE de SQLite solo tratan ASCII.
+        """
+        return texto.lower() if texto is not None else None
+
+    def close(self):
+        """Cierra la conexión a la base de datos. Se llama automáticamente al salir."""
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+            self._buscar_cached.cache_clear()
+            atexit.unregister(self.close)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Agrupa varias altas, bajas y modificaciones en una sola transacción:
+
+            with inventario.transaction():
+                inventario.anadir_producto(...)
+                inventario.actualizar_producto(...)
+
+        Todo se confirma con un único COMMIT al salir del bloque. Dentro del
+        bloque, si una operación falla, además de informar del error lo
+        relanza, de modo que no se confirma nada a medias. Ante cualquier
+        excepción, o si falla el propio COMMIT, se hace ROLLBACK y se recarga
+        el inventario en memoria desde la BD para que vuelva a coincidir con
+        ella. Dentro de otra transacción abierta simplemente se une a ella.
+        """
+        if not self._conn or self._conn.in_transaction:
+            yield
+            return
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._transaccion_activa = True
+        try:
+            yield
+            # El COMMIT también puede fallar (BD ocupada, disco lleno...); en ese
+            # caso se deshace igual para no dejar la transacción abierta.
+            self._conn.execute("COMMIT")
+        except BaseException:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            self.productos = self._cargar_productos()
+            self._buscar_cached.cache_clear()
+            raise
+        finally:
+            self._transaccion_activa = False
+
     def _crear_tabla(self):
         """Crea la tabla 'productos' en la base de datos si no existe."""
-        conn = self._conectar()
-        if conn:
+        if self._conn:
             try:
-                cursor = conn.cursor()
+                cursor = self._conn.cursor()
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS productos (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         nombre TEXT NOT NULL,
                         cantidad INTEGER NOT NULL,
-                        precio REAL NOT NULL
+                        precio REAL NOT NULL,
+                        nombre_min TEXT
                     )
                 """)
-                conn.commit()
+                # Las BD creadas antes de existir 'nombre_min' reciben la columna.
+                columnas = [fila["name"] for fila in cursor.execute("PRAGMA table_info(productos)")]
+                if "nombre_min" not in columnas:
+                    cursor.execute("ALTER TABLE productos ADD COLUMN nombre_min TEXT")
+                # Índice sin distinción de mayúsculas para ordenar por nombre.
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_productos_nombre "
+                               "ON productos(nombre COLLATE NOCASE)")
+                # Índice sobre el nombre en minúsculas usado por las búsquedas.
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_productos_nombre_min "
+                               "ON productos(nombre_min)")
+                self._normalizar_nombres()
             except sqlite3.Error as e:
                 print(f"❌ Error al crear la tabla: {e}")
-            finally:
-                conn.close()
+
+    def _normalizar_nombres(self):
+        """
+        Rellena 'nombre_min' en las filas que no lo tengan (BD antiguas o filas
+        insertadas por otros programas), todo en una sola transacción.
+        """
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT id, nombre FROM productos WHERE nombre_min IS NULL")
+        cambios = [(self._minusculas(fila["nombre"]), fila["id"]) for fila in cursor.fetchall()]
+        if not cambios:
+            return
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.executemany("UPDATE productos SET nombre_min = ? WHERE id = ?", cambios)
+            cursor.execute("COMMIT")
+        except sqlite3.Error:
+            if self._conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
 
     def _cargar_productos(self):
         """Carga todos los productos de la BD en el diccionario en memoria."""
-        conn = self._conectar()
         productos_dict = {}
-        if conn:
+        if self._conn:
             try:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM productos ORDER BY nombre ASC")
-                filas = cursor.fetchall()
-                for fila in filas:
-                    id_prod, nombre, cantidad, precio = fila
-                    producto = Producto(nombre, cantidad, precio, id_prod)
-                    productos_dict[id_prod] = producto # Usando ID como clave
+                cursor = self._conn.cursor()
+                cursor.execute("SELECT id, nombre, cantidad, precio FROM productos")
+                # Se lee por bloques para no materializar toda la tabla de una vez.
+                while filas := cursor.fetchmany(1000):
+                    for fila in filas:
+                        producto = Producto(fila["nombre"], fila["cantidad"], fila["precio"], fila["id"])
+                        productos_dict[fila["id"]] = producto # Usando ID como clave
             except sqlite3.Error as e:
                 print(f"❌ Error al cargar productos: {e}")
-            finally:
-                conn.close()
         return productos_dict
 
+    def _insertar_productos(self, items):
+        """
+        Inserta varios productos en una sola transacción con executemany().
+        Devuelve la lista de productos creados o None si hubo un error.
+        """
+        if not self._conn:
+            return None
+        # Una tupla con otra forma lanza ValueError/TypeError antes de abrir la
+        # transacción; los métodos públicos lo informan como cualquier otro error.
+        filas = [(nombre, self._minusculas(nombre), cantidad, precio)
+                 for nombre, cantidad, precio in items]
+        cursor = self._conn.cursor()
+        # Fuera de transaction() se abre una transacción propia con BEGIN
+        # IMMEDIATE, que toma el bloqueo de escritura antes de leer MAX(id) y
+        # espera el busy timeout si otra conexión está escribiendo. Dentro de
+        # transaction() el bloqueo ya está tomado y basta con un SAVEPOINT.
+        anidada = self._conn.in_transaction
+        try:
+            if anidada:
+                cursor.execute("SAVEPOINT insertar_productos")
+            else:
+                cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM productos")
+            ultimo_id = cursor.fetchone()[0]
+            cursor.executemany("INSERT INTO productos (nombre, nombre_min, cantidad, precio) "
+                               "VALUES (?, ?, ?, ?)", filas)
+            # Dentro de la transacción nadie más escribe, así que los nuevos
+            # registros son justamente los que tienen un ID mayor al anterior.
+            cursor.execute("SELECT id, nombre, cantidad, precio FROM productos WHERE id > ?",
+                           (ultimo_id,))
+            nuevas_filas = cursor.fetchall()
+            cursor.execute("RELEASE insertar_productos" if anidada else "COMMIT")
+        except sqlite3.Error:
+            if anidada:
+                cursor.execute("ROLLBACK TO insertar_productos")
+                cursor.execute("RELEASE insertar_productos")
+            elif self._conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+
+        nuevos = []
+        for id_prod, nombre, cantidad, precio in nuevas_filas:
+            producto = Producto(nombre, cantidad, precio, id_prod)
+            self.productos[id_prod] = producto
+            nuevos.append(producto)
+        self._buscar_cached.cache_clear()
+        return nuevos
+
     def anadir_producto(self, nombre, cantidad, precio):
         """Añade un nuevo producto a la BD y al inventario en memoria."""
-        conn = self._conectar()
-        if conn:
-            try:
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO productos (nombre, cantidad, precio) VALUES (?, ?, ?)",
-                               (nombre, cantidad, precio))
-                conn.commit()
-                id_nuevo = cursor.lastrowid
-                producto_nuevo = Producto(nombre, cantidad, precio, id_nuevo)
-                self.productos[id_nuevo] = producto_nuevo
+        try:
+            if self._insertar_productos([(nombre, cantidad, precio)]) is not None:
                 print(f"✔ Producto '{nombre}' añadido con éxito.")
-            except sqlite3.Error as e:
-                print(f"❌ Error al añadir el producto: {e}")
-            finally:
-                conn.close()
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            print(f"❌ Error al añadir el producto: {e}")
+            if self._transaccion_activa:
+                raise
+
+    def anadir_productos(self, items):
+        """
+        Añade varios productos de una vez. 'items' es un iterable de tuplas
+        (nombre, cantidad, precio); todos se confirman en un único commit.
+        """
+        try:
+            nuevos = self._insertar_productos(items)
+            if nuevos is not None:
+                print(f"✔ {len(nuevos)} productos añadidos con éxito.")
+            return nuevos
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            print(f"❌ Error al añadir los productos: {e}")
+            if self._transaccion_activa:
+                raise
+            return None
 
     def eliminar_producto(self, id_producto):
         """Elimina un producto de la BD y del inventario por su ID."""
-        if id_producto not in self.productos:
+        # pop() comprueba y quita el producto con una sola búsqueda en el diccionario.
+        producto = self.productos.pop(id_producto, None)
+        if producto is None:
             print(f"❌ Error: No existe un producto con el ID {id_producto}.")
             return
 
-        conn = self._conectar()
-        if conn:
+        if self._conn:
             try:
-                cursor = conn.cursor()
+                cursor = self._conn.cursor()
                 cursor.execute("DELETE FROM productos WHERE id = ?", (id_producto,))
-                conn.commit()
-                del self.productos[id_producto] # Sincroniza el diccionario
+                self._buscar_cached.cache_clear()
                 print(f"✔ Producto con ID {id_producto} eliminado con éxito.")
+                return
             except sqlite3.Error as e:
                 print(f"❌ Error al eliminar el producto: {e}")
-            finally:
-                conn.close()
+                if self._transaccion_activa:
+                    raise
+        # No se pudo borrar de la BD: se devuelve el producto al diccionario.
+        self.productos[id_producto] = producto
 
     def actualizar_producto(self, id_producto, cantidad=None, precio=None):
         """Actualiza la cantidad y/o el precio de un producto existente."""
-        if id_producto not in self.productos:
+        producto_actual = self.productos.get(id_producto)
+        if producto_actual is None:
             print(f"❌ Error: No existe un producto con el ID {id_producto}.")
             return
 
-        producto_actual = self.productos[id_producto]
         nueva_cantidad = cantidad if cantidad is not None else producto_actual.cantidad
         nuevo_precio = precio if precio is not None else producto_actual.precio
 
-        conn = self._conectar()
-        if conn:
+        if self._conn:
             try:
-                cursor = conn.cursor()
+                cursor = self._conn.cursor()
                 cursor.execute("UPDATE productos SET cantidad = ?, precio = ? WHERE id = ?",
                                (nueva_cantidad, nuevo_precio, id_producto))
-                conn.commit()
                 producto_actual.cantidad = nueva_cantidad # Sincroniza el objeto
                 producto_actual.precio = nuevo_precio
+                producto_actual._str_cache = None
                 print(f"✔ Producto con ID {id_producto} actualizado con éxito.")
             except sqlite3.Error as e:
                 print(f"❌ Error al actualizar el producto: {e}")
-            finally:
-                conn.close()
+                if self._transaccion_activa:
+                    raise
 
-    def buscar_producto_por_nombre(self, nombre):
-        """Busca productos en memoria cuyo nombre contenga el texto buscado."""
-        resultados = [p for p in self.productos.values() if nombre.lower() in p.nombre.lower()]
-        
-        if not resultados:
-            print(f"No se encontraron productos que coincidan con '{nombre}'.")
-            return
+    def _producto_de_fila(self, fila):
+        """
+        Devuelve el Producto en memoria para la fila dada. Si otra conexión lo
+        creó y aún no está en el diccionario, lo construye y lo añade.
+        """
+        producto = self.productos.get(fila["id"])
+        if producto is None:
+            producto = Producto(fila["nombre"], fila["cantidad"], fila["precio"], fila["id"])
+            self.productos[fila["id"]] = producto
+        return producto
+
+    def _productos_por_ids(self, ids):
+        """
+        Devuelve los productos de 'ids' en ese orden, tomados del diccionario.
+        Los que falten (creados por otra conexión) se leen de la BD en una sola
+        consulta por bloque; los que ya no existan se omiten.
+        """
+        faltan = [id_prod for id_prod in ids if id_prod not in self.productos]
+        try:
+            for i in range(0, len(faltan), 500):
+                bloque = faltan[i:i + 500]
+                marcas = ", ".join("?" * len(bloque))
+                cursor = self._conn.execute("SELECT id, nombre, cantidad, precio FROM productos "
+                                            f"WHERE id IN ({marcas})", bloque)
+                for fila in cursor:
+                    self._producto_de_fila(fila)
+        except sqlite3.Error as e:
+            print(f"❌ Error al cargar productos: {e}")
+        for id_prod in ids:
+            producto = self.productos.get(id_prod)
+            if producto is not None:
+                yield producto
 
-        print("\n--- Resultados de la Búsqueda ---")
-        for producto in resultados:
+    def _ids_por_nombre(self, texto, solo_prefijo):
+        """
+        Devuelve una tupla con los IDs de los productos cuyo nombre, en
+        minúsculas, contiene 'texto' (o empieza por él si solo_prefijo),
+        ordenadas por ese mismo nombre en minúsculas, de modo que filtro y orden
+        salen de idx_productos_nombre_min. 'texto' debe llegar ya en minúsculas.
+        Se llama a través de self._buscar_cached, que guarda los resultados.
+        """
+        if solo_prefijo:
+            # Búsqueda por rango en idx_productos_nombre_min: los nombres que
+            # empiezan por 'texto' quedan entre 'texto' y 'texto' seguido del
+            # mayor carácter Unicode, igual que con bisect sobre una lista ordenada.
+            condicion = "nombre_min >= ? AND nombre_min < ?"
+            parametros = (texto, texto + "\U0010ffff")
+        else:
+            condicion = "instr(nombre_min, ?) > 0"
+            parametros = (texto,)
+        cursor = self._conn.cursor()
+        cursor.execute(f"SELECT id FROM productos WHERE {condicion} ORDER BY nombre_min", parametros)
+        return tuple(fila[0] for fila in cursor.fetchall())
+
+    def _buscar_ids(self, texto, solo_prefijo=False):
+        """Consulta la caché de búsquedas; ante un error lo informa y devuelve ()."""
+        if not self._conn:
+            return ()
+        try:
+            return self._buscar_cached(texto.lower(), solo_prefijo)
+        except sqlite3.Error as e:
+            print(f"❌ Error al buscar productos: {e}")
+            return ()
+
+    @staticmethod
+    def _imprimir_resultados(productos, mensaje_vacio):
+        """
+        Imprime los productos a medida que se recorren (acepta un generador),
+        sin reunirlos antes en una lista. Si no hay ninguno, muestra el aviso.
+        """
+        encontrado = False
+        for producto in productos:
+            if not encontrado:
+                print("\n--- Resultados de la Búsqueda ---")
+                encontrado = True
             print(producto)
+
+        if not encontrado:
+            print(mensaje_vacio)
+            return
         print("---------------------------------")
 
+    def buscar_producto_por_nombre(self, nombre):
+        """Busca en la BD los productos cuyo nombre contenga el texto buscado."""
+        ids = self._buscar_ids(nombre)
+        self._imprimir_resultados(self._productos_por_ids(ids),
+                                  f"No se encontraron productos que coincidan con '{nombre}'.")
+
+    def buscar_producto_por_prefijo(self, prefijo):
+        """Busca productos cuyo nombre empiece por el texto dado."""
+        ids = self._buscar_ids(prefijo, solo_prefijo=True)
+        self._imprimir_resultados(self._productos_por_ids(ids),
+                                  f"No se encontraron productos que empiecen por '{prefijo}'.")
+
     def mostrar_inventario(self):
         """Muestra todos los productos del inventario de forma ordenada."""
         print("\n--- Inventario Completo de la Ferretería ---")
-        if not self.productos:
+        vacio = True
+        if self._conn:
+            # El orden lo resuelve SQLite recorriendo el índice por nombre;
+            # los objetos Producto se reutilizan del diccionario en memoria.
+            try:
+                cursor = self._conn.execute("SELECT id, nombre, cantidad, precio FROM productos "
+                                            "ORDER BY nombre COLLATE NOCASE")
+                for fila in cursor:
+                    vacio = False
+                    print(self._producto_de_fila(fila))
+            except sqlite3.Error as e:
+                print(f"❌ Error al mostrar el inventario: {e}")
+                vacio = False
+        if vacio:
             print("El inventario está vacío.")
-        else:
-            # Ordenamos los productos por nombre para una mejor visualización
-            productos_ordenados = sorted(self.productos.values(), key=lambda p: p.nombre)
-            for producto in productos_ordenados:
-                print(producto)
         print("------------------------------------------")
 
 # =============================================================================